@@ -0,0 +1,193 @@
+import os
+import socket
+import asyncio
+import bisect
+import hashlib
+import logging
+import httpx
+
+def _normalize_url(url: str) -> str:
+    """Brackets a bare IPv6 host (as produced by http://$(POD_IP):port) so URLs match discovered peers."""
+    scheme, sep, rest = url.partition("://")
+    host, _, port = rest.rpartition(":")
+    if ":" in host and not host.startswith("["):
+        return f"{scheme}{sep}[{host}]:{port}"
+    return url
+
+CLUSTER_SELF = _normalize_url(os.getenv("CLUSTER_SELF", "").rstrip("/"))
+CLUSTER_PEERS = [_normalize_url(p.strip().rstrip("/")) for p in os.getenv("CLUSTER_PEERS", "").split(",") if p.strip()]
+# Headless Service whose A (or AAAA, for an IPv6 CLUSTER_SELF) records list every replica;
+# takes precedence over CLUSTER_PEERS.
+CLUSTER_PEER_SERVICE = os.getenv("CLUSTER_PEER_SERVICE", "")
+CLUSTER_PEER_PORT = int(os.getenv("CLUSTER_PEER_PORT", 8081))
+PEER_REFRESH_INTERVAL_SECONDS = int(os.getenv("CLUSTER_PEER_REFRESH_INTERVAL_SECONDS", 15))
+VIRTUAL_NODES = int(os.getenv("CLUSTER_VIRTUAL_NODES", 128))
+FORWARD_TIMEOUT_SECONDS = float(os.getenv("CLUSTER_FORWARD_TIMEOUT_SECONDS", 5))
+MAX_PEER_CONNECTIONS = int(os.getenv("CLUSTER_MAX_PEER_CONNECTIONS", 20))
+
+# Set on requests relayed between replicas so the receiver never forwards them again.
+FORWARDED_HEADER = "X-Log-Analyzer-Forwarded-By"
+
+logger = logging.getLogger(__name__)
+
+def _hash(key: str) -> int:
+    """Stable 64-bit hash; Python's built-in hash() is salted per process."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+class HashRing:
+    """Consistent hash ring mapping fingerprints to the peer that owns them.
+
+    Each peer is placed on the ring at several virtual points, so adding or
+    removing a peer only moves the keys adjacent to its points (~1/N of them).
+    """
+
+    def __init__(self, peers, virtual_nodes=VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self.peers = set()
+        self._points = []
+        self._owners = {}
+        for peer in peers:
+            self.add_peer(peer)
+
+    def add_peer(self, peer: str):
+        if peer in self.peers:
+            return
+        self.peers.add(peer)
+        for i in range(self.virtual_nodes):
+            point = _hash(f"{peer}#{i}")
+            bisect.insort(self._points, point)
+            self._owners[point] = peer
+
+    def remove_peer(self, peer: str):
+        if peer not in self.peers:
+            return
+        self.peers.discard(peer)
+        for i in range(self.virtual_nodes):
+            point = _hash(f"{peer}#{i}")
+            if self._owners.get(point) == peer:
+                del self._owners[point]
+                self._points.remove(point)
+
+    def owner(self, key: str):
+        """Returns the peer owning the key, or None if the ring is empty."""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[self._points[index]]
+
+def cluster_enabled() -> bool:
+    """Cluster mode is on when this replica knows itself and the ring has at least one other peer."""
+    return bool(CLUSTER_SELF) and any(peer != CLUSTER_SELF for peer in ring.peers)
+
+ring = HashRing([] if CLUSTER_PEER_SERVICE else CLUSTER_PEERS)
+peer_client = None
+
+def owner_of(fingerprint: str) -> str:
+    """Returns the peer URL owning the fingerprint; this replica when not clustered."""
+    if not cluster_enabled():
+        return CLUSTER_SELF
+    return ring.owner(fingerprint)
+
+def forwarding_peer(headers):
+    """Returns the peer that forwarded this request, or None if the header is absent.
+
+    A relayed batch is always processed where it lands, even when the sender is not
+    in this replica's ring: re-routing it could bounce it between replicas forever.
+    """
+    peer = headers.get(FORWARDED_HEADER)
+    if peer is not None and (peer == CLUSTER_SELF or peer not in ring.peers):
+        logger.warning(f"{FORWARDED_HEADER} from unknown peer {peer}; processing the batch locally.")
+    return peer
+
+def sync_ring(peers):
+    """Adds and removes ring members so the ring matches the given peer set."""
+    joined = peers - ring.peers
+    left = ring.peers - peers
+    for peer in joined:
+        ring.add_peer(peer)
+    for peer in left:
+        ring.remove_peer(peer)
+    if joined or left:
+        logger.info(f"Cluster membership changed: joined {sorted(joined)}, left {sorted(left)}. Peers: {sorted(ring.peers)}")
+    if CLUSTER_SELF not in ring.peers:
+        logger.error(f"This replica ({CLUSTER_SELF}) is not among the discovered peers; it will own no fingerprints.")
+
+async def discover_peers():
+    """Resolves the headless peer Service into one URL per replica.
+
+    Only the address family of CLUSTER_SELF is used: on a dual-stack cluster each pod
+    has both an A and an AAAA record, and the second would put the pod on the ring twice.
+    """
+    family = socket.AF_INET6 if "://[" in CLUSTER_SELF else socket.AF_INET
+    infos = await asyncio.get_running_loop().getaddrinfo(
+        CLUSTER_PEER_SERVICE, CLUSTER_PEER_PORT, family=family, type=socket.SOCK_STREAM
+    )
+    peers = set()
+    for family, _, _, _, sockaddr in infos:
+        host = f"[{sockaddr[0]}]" if family == socket.AF_INET6 else sockaddr[0]
+        peers.add(f"http://{host}:{CLUSTER_PEER_PORT}")
+    return peers
+
+async def background_peer_refresh():
+    """Keeps the ring in step with the replicas behind the peer Service."""
+    while True:
+        try:
+            peers = await discover_peers()
+            if peers:
+                sync_ring(peers)
+        except OSError as e:
+            logger.error(f"Peer discovery for {CLUSTER_PEER_SERVICE} failed: {e}. Keeping {len(ring.peers)} known peers.")
+        await asyncio.sleep(PEER_REFRESH_INTERVAL_SECONDS)
+
+async def start_peer_client():
+    """Opens the pooled HTTP client shared by all forwards and starts peer discovery if configured."""
+    global peer_client
+    if not CLUSTER_SELF or not (CLUSTER_PEERS or CLUSTER_PEER_SERVICE):
+        logger.info("Cluster mode disabled; all fingerprints are handled locally.")
+        return
+    if not CLUSTER_PEER_SERVICE and CLUSTER_SELF not in CLUSTER_PEERS:
+        raise RuntimeError(
+            f"CLUSTER_SELF {CLUSTER_SELF} is not listed in CLUSTER_PEERS {CLUSTER_PEERS}; "
+            "every replica must build the same ring."
+        )
+    peer_client = httpx.AsyncClient(
+        timeout=FORWARD_TIMEOUT_SECONDS,
+        limits=httpx.Limits(
+            max_connections=MAX_PEER_CONNECTIONS,
+            max_keepalive_connections=MAX_PEER_CONNECTIONS,
+        ),
+    )
+    if CLUSTER_PEER_SERVICE:
+        asyncio.create_task(background_peer_refresh())
+        logger.info(f"Cluster mode enabled as {CLUSTER_SELF}; discovering peers via {CLUSTER_PEER_SERVICE}")
+    else:
+        logger.info(f"Cluster mode enabled as {CLUSTER_SELF} with {len(ring.peers)} peers: {sorted(ring.peers)}")
+
+async def stop_peer_client():
+    global peer_client
+    if peer_client is not None:
+        await peer_client.aclose()
+        peer_client = None
+
+async def forward_to_peer(peer: str, items: list) -> bool:
+    """Hands raw log events to the owning peer, which acknowledges with 202 before analysing them.
+
+    Returns False whenever the owner did not acknowledge the batch, so the caller
+    processes it locally: an alert may then be duplicated but is never dropped.
+    """
+    try:
+        response = await peer_client.post(
+            f"{peer}/analyze",
+            json=items,
+            headers={FORWARDED_HEADER: CLUSTER_SELF},
+        )
+    except httpx.HTTPError as e:
+        logger.error(f"Forwarding {len(items)} logs to {peer} failed: {e!r}")
+        return False
+
+    if response.status_code >= 300:
+        logger.error(f"Owner {peer} did not accept {len(items)} logs: HTTP {response.status_code} {response.text}")
+        return False
+
+    logger.info(f"Forwarded {len(items)} logs to owner {peer}")
+    return True
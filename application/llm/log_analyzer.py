@@ -1,4 +1,5 @@
 from fastapi import FastAPI, Request, HTTPException
+import os
 import json
 import gzip
 import sys
@@ -7,6 +8,7 @@ import asyncio
 import time
 from datetime import datetime
 from fastapi import BackgroundTasks
+from fastapi.responses import JSONResponse
 from email_notification import send_alert_email
 from log_memory import (
     LogEvent,
@@ -16,6 +18,15 @@ from log_memory import (
     CACHE_EXPIRY_SECONDS,
     background_cache_cleanup
 )
+from cluster import (
+    CLUSTER_SELF,
+    cluster_enabled,
+    owner_of,
+    forwarding_peer,
+    forward_to_peer,
+    start_peer_client,
+    stop_peer_client
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -33,6 +44,11 @@ app = FastAPI(
 @app.on_event("startup")
 async def start_background_tasks():
     asyncio.create_task(background_cache_cleanup())
+    await start_peer_client()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await stop_peer_client()
 
 @app.get("/health")
 async def health():
@@ -40,6 +56,53 @@ async def health():
     sys.stdout.flush()
     return {"status": "healthy"}
 
+def claim_new_events(local_events, current_time):
+    """Marks fingerprints as processed and returns the events not already in the dedup cache."""
+    logs_to_process = []
+    for event, fingerprint in local_events:
+        if fingerprint in PROCESSED_FINGERPRINTS and current_time < PROCESSED_FINGERPRINTS[fingerprint]:
+            logger.info(f"Skipping duplicate log from {event.k8s_app_label} (Cached until {datetime.fromtimestamp(PROCESSED_FINGERPRINTS[fingerprint]).strftime('%H:%M:%S')})")
+            continue
+
+        PROCESSED_FINGERPRINTS[fingerprint] = current_time + CACHE_EXPIRY_SECONDS
+        logs_to_process.append(event)
+    return logs_to_process
+
+async def analyze_events(logs_to_process):
+    """Runs the LLM on each event and returns the (event, analysis_result) pairs that parsed."""
+    results_data = await asyncio.gather(*(throttled_process(event) for event in logs_to_process))
+
+    analyzed = []
+    for event, analysis_result_json_str in zip(logs_to_process, results_data):
+        if analysis_result_json_str is None:
+            logger.warning(f"Skipping email for pod {event.k8s_pod} because LLM analysis failed.")
+            continue
+
+        cleaned_str = analysis_result_json_str.strip()
+        if cleaned_str.startswith("```json"):
+            cleaned_str = cleaned_str.strip('`').lstrip('json').strip()
+
+        try:
+            analysis_result = json.loads(cleaned_str)
+            logger.info("-" * 50)
+            logger.info(f"Pod Name: {event.k8s_pod}")
+            logger.info(f"Message: {event.message}")
+            logger.info(f"Service Affected: {analysis_result.get('service_affected')}")
+            logger.info(f"Cause: {analysis_result.get('probable_cause')}")
+            logger.info(f"Suggestion: {analysis_result.get('suggested_action')}")
+            logger.info("-" * 50)
+            analyzed.append((event, analysis_result))
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse LLM JSON for {event.k8s_pod}: {e}")
+            continue
+    return analyzed
+
+async def analyze_and_alert(logs_to_process):
+    """Background path for batches forwarded by a peer: analyse, then send the alert emails."""
+    for event, analysis_result in await analyze_events(logs_to_process):
+        await asyncio.to_thread(send_alert_email, event, analysis_result)
+    sys.stdout.flush()
+
 @app.post("/analyze")
 async def analyze_log(request: Request, background_tasks: BackgroundTasks):
     raw_body_bytes = await request.body()
@@ -56,57 +119,62 @@ async def analyze_log(request: Request, background_tasks: BackgroundTasks):
         body_json = json.loads(raw_body_str)
         events_data = body_json if isinstance(body_json, list) else [body_json]
 
-        analysis_tasks = []
-        logs_to_process = []
         current_time = time.time()
 
+        local_events = []
+        forward_batches = {}
+        forwarded_by = forwarding_peer(request.headers)
+
         for item in events_data:
             event = LogEvent(**item)
             fingerprint = get_fingerprint(event)
+            owner = owner_of(fingerprint)
+
+            if cluster_enabled() and forwarded_by is None and owner != CLUSTER_SELF:
+                forward_batches.setdefault(owner, []).append((item, event, fingerprint))
+            else:
+                local_events.append((event, fingerprint))
+
+        forwarded_count = 0
+        if forward_batches:
+            peers = list(forward_batches)
+            forwarded = await asyncio.gather(
+                *(forward_to_peer(peer, [item for item, _, _ in forward_batches[peer]]) for peer in peers)
+            )
+            for peer, ok in zip(peers, forwarded):
+                if ok:
+                    forwarded_count += len(forward_batches[peer])
+                else:
+                    logger.warning(f"Owner {peer} did not accept the batch; processing its {len(forward_batches[peer])} logs locally.")
+                    local_events.extend((event, fingerprint) for _, event, fingerprint in forward_batches[peer])
+
+        logs_to_process = claim_new_events(local_events, current_time)
+
+        logger.info(f"Received {len(events_data)} logs. Forwarded {forwarded_count} to owners. Processing {len(logs_to_process)} unique logs.")
+
+        if forwarded_by is not None:
+            # Acknowledge right away so the forwarding replica doesn't hold its caller open for our LLM calls.
+            if logs_to_process:
+                background_tasks.add_task(analyze_and_alert, logs_to_process)
+            sys.stdout.flush()
+            return JSONResponse(
+                status_code=202,
+                content={"status": "accepted", "message": f"Queued {len(logs_to_process)} of {len(events_data)} logs forwarded by {forwarded_by}."}
+            )
 
-            if fingerprint in PROCESSED_FINGERPRINTS and current_time < PROCESSED_FINGERPRINTS[fingerprint]:
-                logger.info(f"Skipping duplicate log from {event.k8s_app_label} (Cached until {datetime.fromtimestamp(PROCESSED_FINGERPRINTS[fingerprint]).strftime('%H:%M:%S')})")
-                continue
-
-            PROCESSED_FINGERPRINTS[fingerprint] = current_time + CACHE_EXPIRY_SECONDS
-            logs_to_process.append(event)
-
-            task = asyncio.create_task(throttled_process(event))
-            analysis_tasks.append(task)
-
-        logger.info(f"Received {len(events_data)} logs. Processing {len(analysis_tasks)} unique logs.")
-
-        if not analysis_tasks:
+        if not logs_to_process:
             sys.stdout.flush()
+            if forwarded_count:
+                return {"status": "ok", "message": f"Forwarded {forwarded_count} of {len(events_data)} logs to their owners; the rest were duplicates and skipped."}
             return {"status": "ok", "message": f"All {len(events_data)} logs were duplicates and skipped."}
 
-        results_data = await asyncio.gather(*analysis_tasks)
-
-        for event, analysis_result_json_str in zip(logs_to_process, results_data):
-            if analysis_result_json_str is None:
-                logger.warning(f"Skipping email for pod {event.k8s_pod} because LLM analysis failed.")
-                continue
-
-            cleaned_str = analysis_result_json_str.strip()
-            if cleaned_str.startswith("```json"):
-                cleaned_str = cleaned_str.strip('`').lstrip('json').strip()
-
-            try:
-                analysis_result = json.loads(cleaned_str)
-                logger.info("-" * 50)
-                logger.info(f"Pod Name: {event.k8s_pod}")
-                logger.info(f"Message: {event.message}")
-                logger.info(f"Service Affected: {analysis_result.get('service_affected')}")
-                logger.info(f"Cause: {analysis_result.get('probable_cause')}")
-                logger.info(f"Suggestion: {analysis_result.get('suggested_action')}")
-                logger.info("-" * 50)
-                background_tasks.add_task(send_alert_email, event, analysis_result)
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse LLM JSON for {event.k8s_pod}: {e}")
-                continue
+        for event, analysis_result in await analyze_events(logs_to_process):
+            background_tasks.add_task(send_alert_email, event, analysis_result)
 
         sys.stdout.flush()
 
+        if forwarded_count:
+            return {"status": "ok", "message": f"Successfully processed {len(events_data)} log events ({forwarded_count} forwarded to their owners)."}
         return {"status": "ok", "message": f"Successfully processed {len(events_data)} log events."}
 
     except json.JSONDecodeError:
@@ -117,4 +185,4 @@ async def analyze_log(request: Request, background_tasks: BackgroundTasks):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8081)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8081)))
\ No newline at end of file
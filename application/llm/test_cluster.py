@@ -0,0 +1,152 @@
+import asyncio
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import cluster
+import log_analyzer
+from cluster import HashRing, FORWARDED_HEADER
+from log_memory import LogEvent, get_fingerprint
+
+PEERS = ["http://10.0.0.1:8081", "http://10.0.0.2:8081", "http://10.0.0.3:8081"]
+NEW_PEER = "http://10.0.0.4:8081"
+KEYS = [f"service-{i}:error message {i}" for i in range(20000)]
+
+
+def test_ownership_is_deterministic():
+    ring = HashRing(PEERS)
+    reordered = HashRing(list(reversed(PEERS)))
+    assert all(ring.owner(key) == reordered.owner(key) for key in KEYS)
+
+
+def test_adding_peer_moves_about_one_nth_of_keys():
+    before = HashRing(PEERS)
+    after = HashRing(PEERS + [NEW_PEER])
+    moved = [key for key in KEYS if before.owner(key) != after.owner(key)]
+
+    assert all(after.owner(key) == NEW_PEER for key in moved)
+    assert 0.15 < len(moved) / len(KEYS) < 0.35
+
+
+def test_removing_peer_restores_previous_owners():
+    ring = HashRing(PEERS)
+    owners = {key: ring.owner(key) for key in KEYS}
+
+    ring.add_peer(NEW_PEER)
+    ring.remove_peer(NEW_PEER)
+
+    assert ring.peers == set(PEERS)
+    assert all(ring.owner(key) == owners[key] for key in KEYS)
+
+
+def test_empty_ring_has_no_owner():
+    ring = HashRing([])
+    assert ring.owner("service:error") is None
+
+    ring.add_peer(PEERS[0])
+    ring.remove_peer(PEERS[0])
+    assert ring.owner("service:error") is None
+
+
+def _forward_with(handler):
+    """Runs forward_to_peer against a mocked owner whose responses come from handler."""
+    async def run():
+        cluster.peer_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await cluster.forward_to_peer(PEERS[1], [{"message": "boom"}])
+        finally:
+            await cluster.stop_peer_client()
+    return asyncio.run(run())
+
+
+def _raise(exc_type):
+    def handler(request):
+        raise exc_type("simulated", request=request)
+    return handler
+
+
+def test_forward_is_delivered_when_owner_acknowledges():
+    assert _forward_with(lambda request: httpx.Response(202, json={"status": "accepted"}))
+
+
+@pytest.mark.parametrize("handler", [
+    _raise(httpx.ConnectError),
+    _raise(httpx.ReadTimeout),
+    _raise(httpx.RemoteProtocolError),
+    lambda request: httpx.Response(503),
+    lambda request: httpx.Response(400),
+])
+def test_forward_falls_back_when_owner_does_not_acknowledge(handler):
+    assert not _forward_with(handler)
+
+
+def _event(message):
+    return {
+        "message": message,
+        "level": "ERROR",
+        "k8s_container": "api",
+        "k8s_pod": "api-pod",
+        "k8s_namespace": "prod",
+        "k8s_app_label": "user-data-service",
+        "k8s_job_name": "",
+        "k8s_image": "api:v1",
+        "timestamp": "2025-11-17T11:05:12Z",
+    }
+
+
+@pytest.fixture
+def clustered(monkeypatch):
+    """Makes this process the first of three peers and records forwards and queued analyses."""
+    monkeypatch.setattr(cluster, "CLUSTER_SELF", PEERS[0])
+    monkeypatch.setattr(log_analyzer, "CLUSTER_SELF", PEERS[0])
+    monkeypatch.setattr(cluster, "ring", HashRing(PEERS))
+    calls = {"forwarded": [], "queued": []}
+
+    async def fake_forward(peer, items):
+        calls["forwarded"].append((peer, items))
+        return False
+
+    async def fake_analyze_and_alert(events):
+        calls["queued"].extend(events)
+
+    monkeypatch.setattr(log_analyzer, "forward_to_peer", fake_forward)
+    monkeypatch.setattr(log_analyzer, "analyze_and_alert", fake_analyze_and_alert)
+    return calls
+
+
+def _remote_events(prefix):
+    """Builds events whose fingerprints are owned by a peer other than this replica."""
+    events = [_event(f"{prefix} failure {i}") for i in range(50)]
+    remote = [e for e in events if cluster.ring.owner(get_fingerprint(LogEvent(**e))) != PEERS[0]]
+    assert remote
+    return remote[:3]
+
+
+@pytest.mark.parametrize("sender", [PEERS[1], "http://unknown-peer:8081", PEERS[0]])
+def test_forwarded_batch_is_never_forwarded_again(clustered, sender):
+    events = _remote_events(f"relayed by {sender}")
+
+    response = TestClient(log_analyzer.app).post(
+        "/analyze", json=events, headers={FORWARDED_HEADER: sender}
+    )
+
+    assert response.status_code == 202
+    assert clustered["forwarded"] == []
+    assert [e.message for e in clustered["queued"]] == [e["message"] for e in events]
+
+
+def test_unacknowledged_forward_is_processed_locally(clustered, monkeypatch):
+    events = _remote_events("owner down")
+    analyzed = []
+
+    async def fake_analyze_events(logs_to_process):
+        analyzed.extend(logs_to_process)
+        return []
+
+    monkeypatch.setattr(log_analyzer, "analyze_events", fake_analyze_events)
+
+    response = TestClient(log_analyzer.app).post("/analyze", json=events)
+
+    assert response.status_code == 200
+    assert sum(len(items) for _, items in clustered["forwarded"]) == len(events)
+    assert [e.message for e in analyzed] == [e["message"] for e in events]
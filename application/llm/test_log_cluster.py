@@ -0,0 +1,33 @@
+import json
+import requests
+
+# Exercises fingerprint routing against the local 3-replica cluster from the README.
+# Events are sent to :8082; those owned by :8081 or :8083 are forwarded there, and
+# re-sending the same batch to another replica shows they are still deduplicated.
+
+log_events_list = [
+    {
+        "message": f"OperationalError: connection to server at \"db-{i}.example.com\" failed: timed out",
+        "level": "ERROR",
+        "k8s_container": "data-api-service",
+        "k8s_pod": f"api-pod-v1-{i}",
+        "k8s_namespace": "prod",
+        "k8s_app_label": f"user-data-service-{i}",
+        "k8s_job_name": "",
+        "k8s_image": "api:v3.5",
+        "timestamp": "2025-11-17T11:05:12Z",
+    }
+    for i in range(6)
+]
+
+if __name__ == "__main__":
+    headers = {"Content-Type": "application/json"}
+    payload = json.dumps(log_events_list)
+
+    # First pass: the response reports how many events were forwarded to their owners.
+    response = requests.post("http://localhost:8082/analyze", data=payload, headers=headers)
+    print(":8082 ->", response.json())
+
+    # Second pass through a different replica: every event is routed to the same owner and skipped as a duplicate.
+    response = requests.post("http://localhost:8083/analyze", data=payload, headers=headers)
+    print(":8083 ->", response.json())